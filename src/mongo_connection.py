@@ -1,8 +1,148 @@
+import bson
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
 import pymongo
+from pymongo import DeleteMany, IndexModel, InsertOne, WriteConcern
+from pymongo.collection import Collection
+from pymongo.command_cursor import CommandCursor
+from pymongo.cursor import Cursor
+import collections
+import contextlib
+import hashlib
+import importlib.util
 import json
-import plotly.express as px
-import plotly.io as pio
+import logging
+import mmap
+import multiprocessing
+import multiprocessing.pool
+import os
+import re
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# prefer orjson's C parser for NDJSON ingest, then pysimdjson, falling back to the stdlib
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_dumps = None
+    try:
+        import simdjson
+        _json_loads = simdjson.loads
+    except ImportError:
+        _json_loads = json.loads
+
+# pandas needs one of these engines to read and write the parquet aggregation cache
+_PARQUET_AVAILABLE: bool = any(importlib.util.find_spec(engine) is not None for engine in ("pyarrow", "fastparquet"))
+
+# wire protocol compressors in order of preference, keeping only those whose codec is installed
+_COMPRESSORS: str = ",".join(
+    name for name, module in (("zstd", "zstandard"), ("snappy", "snappy"), ("zlib", "zlib"))
+    if importlib.util.find_spec(module) is not None
+)
+
+
+# pooled MongoClients shared by every MongoDriver in the process, keyed by (host, port)
+_clients: dict[tuple[str, int], pymongo.MongoClient] = {}
+
+
+def _get_client(host: str, port: int) -> pymongo.MongoClient:
+    """
+    Returns the pooled MongoClient for a given host and port, shared by every MongoDriver in the process.
+
+    Args:
+        host (str): The hostname of the MongoDB server.
+        port (int): The port number of the MongoDB server.
+    """
+    client = _clients.get((host, port))
+    if client is None:
+        client = pymongo.MongoClient(host=host, port=port, maxPoolSize=50, minPoolSize=5,
+                                     compressors=_COMPRESSORS, zlibCompressionLevel=6)
+        _clients[(host, port)] = client
+    return client
+
+
+def _iter_ndjson_blocks(json_file: str, block_lines: int) -> Iterator[bytes]:
+    """
+    Yields newline-aligned blocks of raw bytes from a memory-mapped NDJSON file.
+
+    Args:
+        json_file (str): The path to the NDJSON file.
+        block_lines (int): The number of lines per block.
+    """
+    with open(json_file, 'rb') as f:
+        # an empty file cannot be memory-mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # find every newline in one vectorized scan, the array view must be released before the map can close
+            view: np.ndarray = np.frombuffer(mm, dtype=np.uint8)
+            newlines: np.ndarray = np.flatnonzero(view == ord('\n'))
+            del view
+
+            # a block ends just past every block_lines-th newline, with any trailing lines in a final block
+            ends: list[int] = (newlines[block_lines - 1::block_lines] + 1).tolist()
+            if not ends or ends[-1] < len(mm):
+                ends.append(len(mm))
+
+            start: int = 0
+            for end in ends:
+                yield mm[start:end]
+                start = end
+
+
+def _parse_ndjson_block(block: bytes) -> list[RawBSONDocument]:
+    """
+    Parses a block of NDJSON bytes into BSON-encoded documents, skipping blank lines.
+
+    Encoding here, in the parse worker, means pymongo sends the bytes as-is instead of encoding each dict on insert.
+
+    Args:
+        block (bytes): A newline-aligned block of NDJSON bytes.
+    """
+    return [RawBSONDocument(bson.encode(_json_loads(line))) for line in block.splitlines() if line.strip()]
+
+
+def _imap_bounded(pool: multiprocessing.pool.Pool, func, items: Iterator, limit: int) -> Iterator:
+    """
+    Yields func applied to each item on a worker pool, in order, keeping at most limit calls outstanding.
+
+    Unlike Pool.imap, finished results cannot pile up in memory while the consumer falls behind.
+
+    Args:
+        pool (multiprocessing.pool.Pool): The worker pool to run func on.
+        func (Callable): The picklable function to apply.
+        items (Iterator): The arguments to apply func to.
+        limit (int): The maximum number of calls submitted but not yet yielded.
+    """
+    pending: collections.deque = collections.deque()
+    for item in items:
+        if len(pending) >= limit:
+            yield pending.popleft().get()
+        pending.append(pool.apply_async(func, (item,)))
+    while pending:
+        yield pending.popleft().get()
+
+
+def _fields_projection(fields: list[str]) -> dict:
+    """
+    Builds a projection returning only the given fields, excluding _id unless it is listed.
+
+    Args:
+        fields (list[str]): The document fields to return.
+    """
+    projection: dict = {field: 1 for field in fields}
+    projection.setdefault("_id", 0)
+    return projection
 
 
 class MongoDriver():
@@ -13,10 +153,11 @@ class MongoDriver():
         host (str): The hostname of the MongoDB server.
         port (int): The port number of the MongoDB server.
         db_name (str): The name of the MongoDB database.
+        batch_size (int): The default number of documents to send per insert_many call.
 
     """
 
-    def __init__(self, host: str, port: int, db_name: str) -> None:
+    def __init__(self, host: str, port: int, db_name: str, batch_size=100) -> None:
         """
         Constructs a new MongoConnector object.
 
@@ -24,30 +165,69 @@ class MongoDriver():
             host (str): The hostname of the MongoDB server.
             port (int): The port number of the MongoDB server.
             db_name (str): The name of the MongoDB database.
+            batch_size (int): The default number of documents to send per insert_many call.
 
         """
         self.host: str = host
         self.port: int = port
         self.db_name: str = db_name
+        self.batch_size: int = batch_size
         self.client = None
         self.db = None
+        self._collections: dict[str, Collection] = {}
 
     def connect(self) -> None:
         """
-        Connects to the MongoDB server.
+        Connects to the MongoDB server, reusing the process-wide client for this host and port.
         """
         try:
-            self.client: pymongo.MongoClient = pymongo.MongoClient(host=self.host, port=self.port)
+            # always look the client up again, since shutdown() may have closed the one this driver last used
+            self.client: pymongo.MongoClient = _get_client(self.host, self.port)
+            self._collections.clear()
             self.db = self.client[self.db_name]
-            print(self.db)
+            logger.info("Connected to %s", self.db)
         except pymongo.errors.ConnectionFailure as e:
-            print(f"Failed to connect to MongoDB server: {e}")
+            logger.error("Failed to connect to MongoDB server: %s", e)
 
     def disconnect(self) -> None:
         """
-        Disconnects from the MongoDB server.
+        Disconnects from the MongoDB server, leaving the shared connection pool open for reuse.
         """
-        self.client.close()
+        self.client = None
+        self.db = None
+        self._collections.clear()
+
+    @staticmethod
+    def shutdown() -> None:
+        """
+        Closes every pooled MongoDB client in the process, drivers must call connect() again to open new ones.
+        """
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+    def _coll(self, collection_name: str) -> Collection:
+        """
+        Returns a cached handle to a given collection on the established database.
+
+        Args:
+            collection_name (str): The collection name to look up.
+        """
+        collection = self._collections.get(collection_name)
+        if collection is None:
+            # indexing the database builds a local handle without a server round-trip
+            collection = self.db[collection_name]
+            self._collections[collection_name] = collection
+        return collection
+
+    def _raw_coll(self, collection_name: str) -> Collection:
+        """
+        Returns a handle to a given collection that yields documents as undecoded RawBSONDocuments.
+
+        Args:
+            collection_name (str): The collection name to look up.
+        """
+        return self._coll(collection_name).with_options(codec_options=CodecOptions(document_class=RawBSONDocument))
     
     def flush_collection(self, collection_name: str) -> None:
         """
@@ -56,11 +236,11 @@ class MongoDriver():
         Args:
             collection_name (str): The collection name to flush.
         """
-        collection= self.db[collection_name]
+        collection = self._coll(collection_name)
 
         # Delete all documents in the collection
         result = collection.delete_many({})
-        print(f"Deleted {result.deleted_count} documents from {collection.name}")
+        logger.info("Deleted %s documents from %s", result.deleted_count, collection_name)
 
     def remove_collection(self, collection_name: str) -> None:
         """
@@ -69,11 +249,11 @@ class MongoDriver():
         Args:
             collection_name (str): The collection name to remove.
         """
-        collection = self.db[collection_name]
+        collection = self._coll(collection_name)
 
         # Drop the collection
         collection.drop()
-        print(f"Dropped {collection.name} from {self.db.name}")
+        logger.info("Dropped %s from %s", collection_name, self.db_name)
     
     def create_collection(self, collection_name: str) -> None:
         """
@@ -83,18 +263,30 @@ class MongoDriver():
             collection_name (str): The collection name to create.
         """
         self.db.create_collection(collection_name)
-        print(f"Created collecton {collection_name} in {self.db.name}")
+        logger.info("Created collection %s in %s", collection_name, self.db_name)
     
-    def collection_size(self, collection_name: str) -> int:
+    def collection_size(self, collection_name: str, exact=False) -> int:
         """
         Checks the size of a given collection on the established database on the MongoDB server.
 
+        The default reads the count from collection metadata in O(1), which can drift after an unclean shutdown
+        or while orphaned documents exist on a sharded cluster. An exact count scans the _id index instead.
+
         Args:
             collection_name (str): The collection name to create.
+            exact (bool): Whether to count the documents exactly rather than read the metadata estimate.
         """
-        return len(list(self.db[collection_name].find({})))
+        collection = self._coll(collection_name)
+
+        # count from the _id index rather than pulling every document
+        if exact:
+            return collection.count_documents({}, hint='_id_')
+
+        # read the count from collection metadata rather than pulling every document
+        return collection.estimated_document_count()
 
-    def insert_data(self, collection_name: str, json_file: str, clear=False) -> None:
+    def insert_data(self, collection_name: str, json_file: str, clear=False, batch_size=None, processes=1, fast=False,
+                    threads=1, drop_indexes=False) -> None:
         """
         Inserts data from a JSON file into a MongoDB collection.
 
@@ -102,33 +294,134 @@ class MongoDriver():
             collection_name (str): The name of the MongoDB collection.
             json_file (str): The path to the JSON file.
             clear (bool): Whether to clear the collection of existing data.
+            batch_size (None | int): The number of documents to send per insert_many call, defaults to the driver's batch_size.
+            processes (int): The number of worker processes to parse the file with.
+            fast (bool): Whether to send unacknowledged (w=0) writes, insert errors are then not reported.
+            threads (int): The number of insert_many calls to keep in flight at once.
+            drop_indexes (bool): Whether to drop secondary indexes during the load and rebuild them afterwards,
+                unique indexes are kept in place so the load still rejects duplicate keys.
         """
+        # the load can be rerun from the source file, so never wait on the journal, and skip acknowledgement if asked
+        write_concern: WriteConcern = WriteConcern(w=0) if fast else WriteConcern(w=1, j=False)
+        collection = self._coll(collection_name).with_options(write_concern=write_concern)
+
+        # the source file is trusted, so skip server-side schema validation, which pymongo refuses on w=0 writes
+        bypass: bool = not fast
+
+        if batch_size is None:
+            batch_size = self.batch_size
+
+        # drop secondary indexes so the load does not update them document by document, keeping unique indexes
+        # since the load would otherwise accept duplicates that then fail the rebuild
+        saved_indexes: list[IndexModel] = []
+        if drop_indexes:
+            for spec in list(self._coll(collection_name).list_indexes()):
+                if spec["name"] != "_id_" and not spec.get("unique"):
+                    # a text index reports its key as _fts/_ftsx, so rebuild the text fields from its weights
+                    key: list[tuple] = []
+                    for field, direction in spec["key"].items():
+                        if field == "_fts":
+                            key.extend((text_field, "text") for text_field in spec["weights"])
+                        elif field != "_ftsx":
+                            key.append((field, direction))
+                    options: dict = {k: v for k, v in spec.items() if k not in ("v", "key", "ns")}
+                    saved_indexes.append(IndexModel(key, **options))
+                    self._coll(collection_name).drop_index(spec["name"])
+            logger.info("Dropped %s indexes on %s for the load", len(saved_indexes), collection_name)
+
+        total: int = 0
+        pending_clear: bool = clear
+        blocks: Iterator[bytes] = _iter_ndjson_blocks(json_file, batch_size)
+
         try:
-            collection = self.db.create_collection(collection_name)
-        except:
-            collection = self.db[collection_name]
+            with contextlib.ExitStack() as stack:
+                # parse each block in a worker process when asked to, keeping at most two blocks per
+                # process outstanding so parsed batches do not pile up in memory behind slow inserts
+                if processes > 1:
+                    pool = stack.enter_context(multiprocessing.Pool(processes))
+                    batches: Iterator[list] = _imap_bounded(pool, _parse_ndjson_block, blocks, 2 * processes)
+                else:
+                    batches = map(_parse_ndjson_block, blocks)
+
+                # overlap the round trips of several batches on the client's connection pool when asked to
+                executor: Optional[ThreadPoolExecutor] = None
+                if threads > 1:
+                    executor = stack.enter_context(ThreadPoolExecutor(max_workers=threads))
+                in_flight: collections.deque = collections.deque()
+
+                for batch in batches:
+                    if not batch:
+                        continue
+                    if pending_clear:
+                        # send the clear and the first batch as one bulk write, ordered since an
+                        # unordered bulk write runs its inserts before its deletes
+                        result = collection.bulk_write([DeleteMany({})] + [InsertOne(doc) for doc in batch],
+                                                       ordered=True, bypass_document_validation=bypass)
+                        if result.acknowledged:
+                            logger.info("Deleted %s documents from %s", result.deleted_count, collection_name)
+                        pending_clear = False
+                    elif executor is not None:
+                        # keep at most two batches per thread queued so parsed batches do not pile up in memory
+                        if len(in_flight) >= 2 * threads:
+                            in_flight.popleft().result()
+                        in_flight.append(executor.submit(collection.insert_many, batch, ordered=False,
+                                                         bypass_document_validation=bypass))
+                    else:
+                        collection.insert_many(batch, ordered=False, bypass_document_validation=bypass)
+                    total += len(batch)
+
+                # surface any error from the batches still in flight
+                for future in in_flight:
+                    future.result()
+
+            # an empty file still clears the collection
+            if pending_clear:
+                self.flush_collection(collection_name)
+        finally:
+            # rebuild the dropped indexes in one pass over the loaded data, even if the load failed part way
+            if saved_indexes:
+                self._coll(collection_name).create_indexes(saved_indexes)
+                logger.info("Rebuilt %s indexes on %s", len(saved_indexes), collection_name)
+
+        logger.info("%s documents inserted into collection %s in the %s database.", total, collection_name, self.db_name)
+    
+    def ensure_indexes(self, collection_name: str, fields: list) -> None:
+        """
+        Creates an ascending index for each of the given fields of a collection on the established database.
 
-        if clear:
-            self.flush_collection(collection_name)
+        Args:
+            collection_name (str): The collection name to index.
+            fields (list[str | list[str]]): The document fields to index, a list of fields builds one compound index.
+        """
+        collection = self._coll(collection_name)
 
-        with open(json_file) as f:
-            # data: list = json.load(f)
-            data: str = f.read()
+        indexes: list[IndexModel] = []
+        for field in fields:
+            keys: list[str] = [field] if isinstance(field, str) else field
+            indexes.append(IndexModel([(key, pymongo.ASCENDING) for key in keys]))
 
-            # Split the data into individual JSON objects
-            objects: list[str] = data.strip().split('\n')
+        # build every index in one createIndexes command, existing indexes are left untouched
+        collection.create_indexes(indexes)
+        logger.info("Ensured indexes on %s in %s", fields, collection_name)
 
-            # Wrap the objects in an array
-            json_data: str = '[' + ','.join(objects) + ']'
+    def backfill_size_field(self, collection_name: str, array_field: str, size_field: str) -> None:
+        """
+        Stores the length of an array field in its own field, so array-length filters can use an index.
 
-            # Load the JSON data as a Python object
-            data = json.loads(json_data)
+        Args:
+            collection_name (str): The collection name to update.
+            array_field (str): The array field to measure.
+            size_field (str): The field to store the array length in.
+        """
+        collection = self._coll(collection_name)
 
-            collection.insert_many(list(data))
+        # a single update pipeline computes the size server-side, skipping documents already backfilled
+        result = collection.update_many({size_field: {"$exists": False}},
+                                        [{"$set": {size_field: {"$size": {"$ifNull": [f"${array_field}", []]}}}}])
+        logger.info("Backfilled %s on %s documents in %s", size_field, result.modified_count, collection_name)
 
-        print(f"{len(data)} documents inserted into collection {collection_name} in the {self.db.name} database.")
-    
-    def search_query(self, collection_name: str, qu: dict, proj:dict, lim=10, show=False) -> list:
+    def search_query(self, collection_name: str, qu: dict, proj:dict=None, lim=10, hint=None, batch_size=1000, raw=False,
+                     fields=None) -> Cursor:
         """
         Method to execute queries on a given collection on the established database on the MongoDB server.
 
@@ -137,83 +430,273 @@ class MongoDriver():
             query (dict): The collection query to execute.
             projection (dict): The projection to map.
             lim (int): The limit on the number of objects to return.
-            show (bool): Whether to display the given query.
+            hint (None | str | list): The index name or key pattern the query planner must use.
+            batch_size (int): The number of documents to fetch per getMore.
+            raw (bool): Whether to return undecoded RawBSONDocuments, decoding fields only when accessed.
+            fields (None | list[str]): The only fields to return, replacing the projection when given.
+
+        Returns:
+            Cursor: A lazy cursor over the matching documents.
         """
 
-        # set the collection name, create a new collection if necessary
-        try:
-            collection = self.db.create_collection(collection_name)
-        except:
-            collection = self.db[collection_name]
-        
+        # look up the collection handle, MongoDB creates it on first write if necessary
+        collection = self._raw_coll(collection_name) if raw else self._coll(collection_name)
+
+        if fields is not None:
+            proj = _fields_projection(fields)
+
         # execute the find() query with given query, projection, and limit
-        documents = collection.find(qu, proj).limit(lim)
+        return collection.find(qu, proj, hint=hint, limit=lim, batch_size=batch_size)
 
-        result: list = []
 
-        # append each doc to the result, printing if necessary
-        for document in documents:
-            if show:
-                print(document)
-            result.append(document)
+    def count_query(self, collection_name: str, qu: dict) -> int:
+        """
+        Method to count the documents matching a query on a given collection on the established database on the MongoDB server.
+
+        Args:
+            collection_name (str): The collection name to count on.
+            qu (dict): The collection query to match.
+        """
+
+        # look up the collection handle, MongoDB creates it on first write if necessary
+        collection = self._coll(collection_name)
 
-        return result
+        # count_documents runs the same $match/$group aggregation server-side, but returns the count as an int
+        return collection.count_documents(qu)
 
 
-    def aggregate_query(self, collection_name: str, query, show=False) -> list:
+    def aggregate_query(self, collection_name: str, query, batch_size=1000, allow_disk_use=False,
+                        max_time_ms=30_000, comment="MongoDriver.aggregate_query", hint=None, raw=False,
+                        fields=None) -> CommandCursor:
         """
         Method to execute aggregate queries on a given collection on the established database on the MongoDB server.
 
         Args:
             collection_name (str): The collection name to create.
             query (dict | list): The collection query to execute.
-            show (bool): Whether to display the given query.
+            batch_size (int): The number of documents to fetch per getMore.
+            allow_disk_use (bool): Whether the server may spill pipeline stages to disk.
+            max_time_ms (int): The server-side time limit for the pipeline, in milliseconds.
+            comment (str): The comment attached to the command, shown in the profiler and logs.
+            hint (None | str | list): The index name or key pattern the pipeline's first stage must use.
+            raw (bool): Whether to return undecoded RawBSONDocuments, decoding fields only when accessed.
+            fields (None | list[str]): The only fields to return, appended to the pipeline as a final $project.
+
+        Returns:
+            CommandCursor: A lazy cursor over the pipeline output.
         """
 
-        # set the collection name, create a new collection if necessary
-        try:
-            collection = self.db.create_collection(collection_name)
-        except:
-            collection = self.db[collection_name]
+        # look up the collection handle, MongoDB creates it on first write if necessary
+        collection = self._raw_coll(collection_name) if raw else self._coll(collection_name)
+
+        if fields is not None:
+            query = list(query) + [{"$project": _fields_projection(fields)}]
+
+        # only send a hint when one is given, the server rejects a null hint
+        options: dict = {} if hint is None else {"hint": hint}
 
         # execute the aggregate() query
-        documents = collection.aggregate(query)
+        return collection.aggregate(query, batchSize=batch_size, allowDiskUse=allow_disk_use,
+                                    maxTimeMS=max_time_ms, comment=comment, **options)
+    
+    def aggregate_to_frame(self, collection_name: str, query: list, fields: list[str], batch_size=5000) -> pd.DataFrame:
+        """
+        Method to execute an aggregate query and collect the given fields of its output straight into a dataframe.
 
-        # append each doc to the result, printing if necessary
-        result: list = []
-        for document in documents:
-            if show:
+        Args:
+            collection_name (str): The collection name to aggregate.
+            query (list): The aggregation pipeline to execute.
+            fields (list[str]): The output fields to keep, one dataframe column each.
+            batch_size (int): The number of documents to fetch per getMore.
+        """
+
+        # fill one list per field while draining the cursor, no intermediate list of documents is built
+        columns: dict[str, list] = {field: [] for field in fields}
+        for document in self.aggregate_query(collection_name, query, batch_size=batch_size, fields=fields):
+            for field, column in columns.items():
+                column.append(document.get(field))
+
+        return pd.DataFrame(columns)
+
+    def cached_aggregate(self, collection_name: str, query: list, fields: list[str], cache_dir='.cache') -> pd.DataFrame:
+        """
+        Method to execute an aggregate query through aggregate_to_frame, caching the dataframe to a parquet file.
+
+        The cache key hashes the collection name, the pipeline, the fields and the collection's document count,
+        so loading or removing documents invalidates earlier results.
+
+        Args:
+            collection_name (str): The collection name to aggregate.
+            query (list): The aggregation pipeline to execute.
+            fields (list[str]): The output fields to keep, one dataframe column each.
+            cache_dir (str): The directory to store cached dataframes in.
+        """
+
+        # without a parquet engine there is nowhere to cache to, so always aggregate
+        if not _PARQUET_AVAILABLE:
+            return self.aggregate_to_frame(collection_name, query, fields)
+
+        count: int = self.collection_size(collection_name)
+        key: str = hashlib.blake2b(json.dumps([collection_name, query, fields, count], default=str).encode()).hexdigest()
+        path: str = os.path.join(cache_dir, f"{key}.parquet")
+
+        if os.path.exists(path):
+            logger.info("Loaded cached aggregation on %s from %s", collection_name, path)
+            return pd.read_parquet(path)
+
+        df: pd.DataFrame = self.aggregate_to_frame(collection_name, query, fields)
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # write to a temporary file and rename it into place, so an interrupted write never leaves a truncated cache
+        fd, tmp_path = tempfile.mkstemp(suffix=".parquet.tmp", dir=cache_dir)
+        os.close(fd)
+        try:
+            df.to_parquet(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        logger.info("Cached aggregation on %s to %s", collection_name, path)
+        return df
+
+    def materialize_query(self, collection_name: str, query: list, into: str, hint=None, refresh=False) -> str:
+        """
+        Method to run an aggregate query and store its output in another collection on the established database.
+
+        The output collection's name suffixes into with a hash of the collection name and the pipeline, so changing
+        the pipeline materializes into a fresh collection, and outputs of earlier pipelines are dropped. An existing
+        output is reused unless a refresh is asked for.
+
+        Args:
+            collection_name (str): The collection name to aggregate.
+            query (list): The aggregation pipeline to execute.
+            into (str): The prefix of the collection name to store the output in.
+            hint (None | str | list): The index name or key pattern the pipeline's first stage must use.
+            refresh (bool): Whether to rebuild the output even if it already exists, e.g. after reloading the source.
+
+        Returns:
+            str: The name of the collection holding the output.
+        """
+        key: str = hashlib.blake2b(json.dumps([collection_name, query], default=str).encode(), digest_size=8).hexdigest()
+        target: str = f"{into}_{key}"
+
+        if not refresh and self.collection_size(target) > 0:
+            return target
+
+        # drop the outputs of earlier pipelines, and this one's when refreshing, so no stale documents survive
+        for name in self.db.list_collection_names(filter={"name": {"$regex": f"^{re.escape(into)}_[0-9a-f]{{16}}$"}}):
+            self.remove_collection(name)
+
+        # look up the collection handle, MongoDB creates it on first write if necessary
+        collection = self._coll(collection_name)
+
+        # only send a hint when one is given, the server rejects a null hint
+        options: dict = {} if hint is None else {"hint": hint}
+
+        # the $merge stage writes server-side, so the returned cursor is empty
+        collection.aggregate(query + [{"$merge": {"into": target, "whenMatched": "replace", "whenNotMatched": "insert"}}],
+                             **options)
+        logger.info("Materialized %s aggregation into %s", collection_name, target)
+        return target
+
+    @staticmethod
+    def print_documents(documents) -> None:
+        """
+        Method to print query results one document per line.
+
+        With orjson installed and a binary stdout, documents are written as JSON bytes, skipping the cost of repr.
+
+        Args:
+            documents (list | Cursor | CommandCursor): The documents to print.
+        """
+        buffer = getattr(sys.stdout, "buffer", None)
+        if _json_dumps is None or buffer is None:
+            for document in documents:
                 print(document)
-            result.append(document)
+            return
+
+        # flush pending text output first so it is not reordered behind the bytes
+        sys.stdout.flush()
+        for document in documents:
+            # orjson cannot serialize the raw documents returned with raw=True, so decode them first
+            if isinstance(document, RawBSONDocument):
+                document = bson.decode(document.raw)
+            buffer.write(_json_dumps(document, default=str) + b"\n")
+        buffer.flush()
 
-        return result
-    
     @staticmethod
-    def plot_query( mongo_responnse: list, 
+    def client_side_group(docs, keys: list[str], value='count') -> pd.DataFrame:
+        """
+        Method to count documents per distinct combination of keys in memory, for responses not grouped server-side.
+
+        Args:
+            docs (list | pd.DataFrame): The documents to group.
+            keys (list[str]): The fields to group on.
+            value (str): The name of the resulting count column.
+        """
+
+        # keep only the grouping columns, then let pandas hash-group them rather than walking dicts in Python
+        df: pd.DataFrame = docs if isinstance(docs, pd.DataFrame) else pd.DataFrame(docs, columns=keys)
+        return df.groupby(keys, as_index=False, dropna=False).size().rename(columns={"size": value})
+
+    @staticmethod
+    def plot_query( mongo_responnse, 
                     x_var: str, 
                     y_var: str, 
                     color_on:str, 
                     plot_title:str, 
-                    save_as=None) -> None:
+                    save_as=None,
+                    show=True) -> None:
         """
         Method to plot visualizations from a given MongoDB query response.
 
         Args:
-            mongo_responnse (list): The query response.
+            mongo_responnse (list | Cursor | CommandCursor | pd.DataFrame): The query response, or a dataframe from
+                aggregate_to_frame.
+                Raw documents without y_var are counted per x_var and color_on with client_side_group.
             x_var (str): The query variable to plot on the x-axis.
             y_var (str): The query variable to plot on the y-axis.
             color_on (str): The query variable to color the plot on.
             plot_title (str): Display title for the visualization.
             save_as (None | str): Defines where and how to save the resulting plot.
+            show (bool): Whether to display the figure, skipping it avoids starting a renderer for headless saves.
         """
 
-        # write the query output to a dataframe
-        df: pd.DataFrame = pd.DataFrame(mongo_responnse)
-
-        # create the figure given the passed x_var, y_var, color, and title
-        fig = px.bar(df, x=x_var, y=y_var, color=color_on, title=plot_title)
+        # drain cursors into a list, indexing a Cursor would run another query and a CommandCursor cannot be indexed
+        if not isinstance(mongo_responnse, (pd.DataFrame, list)):
+            mongo_responnse = list(mongo_responnse)
+
+        # count raw documents client-side when the response has not already been reduced to a y_var per row
+        if isinstance(mongo_responnse, pd.DataFrame):
+            reduced: bool = y_var in mongo_responnse.columns
+        else:
+            reduced = not mongo_responnse or y_var in mongo_responnse[0]
+        if not reduced:
+            mongo_responnse = MongoDriver.client_side_group(mongo_responnse, list(dict.fromkeys([x_var, color_on])),
+                                                            value=y_var)
+
+        # read (x, y, color) rows straight from the query output
+        if isinstance(mongo_responnse, pd.DataFrame):
+            rows = mongo_responnse[[x_var, y_var, color_on]].itertuples(index=False, name=None)
+        else:
+            rows = ((doc.get(x_var), doc.get(y_var), doc.get(color_on)) for doc in mongo_responnse)
+
+        # the rows are already grouped server-side, so bucket them by color in one pass, one bar trace per color
+        buckets: dict = {}
+        for x, y, color in rows:
+            xs, ys = buckets.setdefault(color, ([], []))
+            xs.append(x)
+            ys.append(y)
+
+        # create the stacked figure given the passed x_var, y_var, color, and title
+        fig = go.Figure([go.Bar(name=str(color), x=xs, y=ys) for color, (xs, ys) in buckets.items()])
+        fig.update_layout(barmode='stack', title=plot_title, xaxis_title=x_var, yaxis_title=y_var,
+                          legend_title_text=color_on)
 
         # display the figure and save if desired
-        fig.show()
+        if show:
+            fig.show()
         if save_as is not None:
-            pio.write_image(fig, save_as)
+            # pass the format explicitly rather than having plotly infer it on every export
+            image_format: str = os.path.splitext(save_as)[1].lstrip('.') or 'png'
+            fig.write_image(save_as, format=image_format, width=1200, height=800)
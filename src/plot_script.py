@@ -1,18 +1,38 @@
+import logging
+
 from mongo_connection import MongoDriver
 
+logger = logging.getLogger(__name__)
+
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     mongo: MongoDriver = MongoDriver('localhost', 27017, 'restaurants')
     mongo.connect()
 
-    if mongo.collection_size("restaurants_collection") == 0:
+    # the materialized plot counts are stale once the data is reloaded
+    reloaded: bool = mongo.collection_size("restaurants_collection") == 0
+    if reloaded:
         mongo.insert_data('restaurants_collection', 'data/restaurants.json', clear=False)
         print("\n Query to make a visualization of the distribution of restaurants across different cuisines in the NYC boroughs: \n")
-    res: list = mongo.aggregate_query("restaurants_collection", [{"$group": {"_id": {"borough": "$borough", "cuisine": "$cuisine"}, "count": {"$sum": 1}}},
-                                                                    {"$project": {"borough": "$_id.borough", "cuisine": "$_id.cuisine", "count": "$count", "_id": 0}}]
-                                                                    , show=False)
-    for item in res[:10]:
-        print(item)
-
-    mongo.plot_query(res, x_var="borough", y_var="count", color_on="cuisine", plot_title="Resturant Count by Cuisine in NYC Boroughs", save_as='../data/mongo_visualization.png')
-    mongo.disconnect()
\ No newline at end of file
+
+    # index after the bulk load, building indexes during the insert would update every index per document
+    mongo.ensure_indexes('restaurants_collection', ["name", "borough", "cuisine", "address.zipcode", "grades.0.grade",
+                                                    ["borough", "cuisine"]])
+
+    # aggregate the borough x cuisine counts once per pipeline, later runs read them back from the materialized collection,
+    # string-typed filters drop restaurants with a missing or null borough or cuisine before grouping
+    view: str = mongo.materialize_query("restaurants_collection", [{"$match": {"borough": {"$type": "string"}, "cuisine": {"$type": "string"}}},
+                                                                   {"$project": {"borough": 1, "cuisine": 1, "_id": 0}},
+                                                                   {"$group": {"_id": {"borough": "$borough", "cuisine": "$cuisine"}, "count": {"$sum": 1}}},
+                                                                   {"$project": {"borough": "$_id.borough", "cuisine": "$_id.cuisine", "count": "$count"}}],
+                                        into="restaurants_borough_cuisine", refresh=reloaded)
+    res: list = list(mongo.search_query(view, {}, lim=0, fields=["borough", "count", "cuisine"]))
+    # preview the first results only when debug logging is on, skipping the repr cost otherwise
+    if logger.isEnabledFor(logging.DEBUG):
+        for item in res[:10]:
+            logger.debug("%r", item)
+
+    mongo.plot_query(res, x_var="borough", y_var="count", color_on="cuisine", plot_title="Resturant Count by Cuisine in NYC Boroughs", save_as='../data/mongo_visualization.png', show=False)
+    mongo.disconnect()
+    MongoDriver.shutdown()
\ No newline at end of file